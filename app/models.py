@@ -3,6 +3,29 @@ from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+# PostgreSQL upgrades for databases created before these columns and indexes
+# existed (db.create_all() only creates missing tables), run by `flask
+# upgrade-db`. Each (check, statement) pair runs the statement only when the
+# catalog check says it is still needed, so a rerun takes no table locks.
+UPGRADE_STEPS = [
+    ("SELECT NOT EXISTS (SELECT 1 FROM information_schema.columns "
+     "WHERE table_name = 'api_endpoints' AND column_name = 'check_mode')",
+     "ALTER TABLE api_endpoints ADD COLUMN check_mode VARCHAR(10) DEFAULT 'GET'"),
+    ("SELECT to_regclass('ix_monitoring_endpoint_timestamp') IS NULL",
+     "CREATE INDEX ix_monitoring_endpoint_timestamp ON monitoring_results (endpoint_id, timestamp)"),
+    ("SELECT to_regclass('ix_alert_resolved_timestamp') IS NULL",
+     "CREATE INDEX ix_alert_resolved_timestamp ON alerts (is_resolved, timestamp)"),
+    # Keep only the newest active alert per endpoint and type so the unique
+    # index below can be built; resolved_at is naive UTC like datetime.utcnow()
+    ("SELECT to_regclass('ix_alert_active') IS NULL",
+     "UPDATE alerts SET is_resolved = true, resolved_at = timezone('utc', now()) "
+     "WHERE is_resolved = false AND id NOT IN ("
+     "SELECT MAX(id) FROM alerts WHERE is_resolved = false GROUP BY endpoint_id, alert_type)"),
+    ("SELECT to_regclass('ix_alert_active') IS NULL",
+     "CREATE UNIQUE INDEX ix_alert_active ON alerts (endpoint_id, alert_type) "
+     "WHERE is_resolved = false"),
+]
+
 class APIEndpoint(db.Model):
     """Model for storing API endpoints to monitor"""
     __tablename__ = 'api_endpoints'
@@ -11,6 +34,7 @@ class APIEndpoint(db.Model):
     name = db.Column(db.String(100), nullable=False)
     url = db.Column(db.String(500), nullable=False)
     method = db.Column(db.String(10), default='GET')
+    check_mode = db.Column(db.String(10), default='GET')  # 'GET' (capped body read) or 'HEAD'
     headers = db.Column(db.JSON, default={})
     timeout = db.Column(db.Integer, default=30)
     is_active = db.Column(db.Boolean, default=True)
@@ -26,6 +50,10 @@ class APIEndpoint(db.Model):
 class MonitoringResult(db.Model):
     """Model for storing API monitoring results"""
     __tablename__ = 'monitoring_results'
+    __table_args__ = (
+        # Per-endpoint time window queries (stats, chart data)
+        db.Index('ix_monitoring_endpoint_timestamp', 'endpoint_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     endpoint_id = db.Column(db.Integer, db.ForeignKey('api_endpoints.id'), nullable=False)
@@ -42,6 +70,15 @@ class MonitoringResult(db.Model):
 class Alert(db.Model):
     """Model for storing alerts"""
     __tablename__ = 'alerts'
+    __table_args__ = (
+        # Active/resolved alert listings ordered by time
+        db.Index('ix_alert_resolved_timestamp', 'is_resolved', 'timestamp'),
+        # At most one active alert per endpoint and type; also the conflict
+        # target for the alert upsert in APIMonitor.create_alert
+        db.Index('ix_alert_active', 'endpoint_id', 'alert_type', unique=True,
+                 postgresql_where=db.text('is_resolved = false'),
+                 sqlite_where=db.text('is_resolved = 0')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     endpoint_id = db.Column(db.Integer, db.ForeignKey('api_endpoints.id'), nullable=False)
@@ -63,3 +100,18 @@ def init_db(app):
     db.init_app(app)
     with app.app_context():
         db.create_all()
+    
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        """Upgrade an existing PostgreSQL schema to the current models"""
+        upgrade_db()
+
+def upgrade_db():
+    """Bring an existing PostgreSQL schema up to date with the models"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    
+    with db.engine.begin() as conn:
+        for check, statement in UPGRADE_STEPS:
+            if conn.execute(db.text(check)).scalar():
+                conn.execute(db.text(statement))
@@ -1,167 +1,463 @@
+import asyncio
+import atexit
+import aiohttp
 import requests
+import socket
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 from flask import current_app
+from sqlalchemy import func, case, update, delete, select, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
 from app.models import db, APIEndpoint, MonitoringResult, Alert
 from app.email_alerts import send_alert_email, send_resolution_email
 
+# Statements for the queries run every monitoring cycle, built once at import.
+# Values are passed as bound parameters, so every execution hits the engine's
+# compiled statement cache instead of rebuilding and recompiling the query.
+ACTIVE_ENDPOINTS = select(APIEndpoint).where(APIEndpoint.is_active == True)
+ACTIVE_ENDPOINTS_BY_ID = ACTIVE_ENDPOINTS.where(
+    APIEndpoint.id.in_(bindparam('endpoint_ids', expanding=True))
+)
+UNRESOLVED_ALERTS = select(Alert.id, Alert.endpoint_id, Alert.alert_type).where(
+    Alert.is_resolved == False,
+    Alert.endpoint_id.in_(bindparam('endpoint_ids', expanding=True))
+)
+
+_positive_response_time = case(
+    (MonitoringResult.response_time > 0, MonitoringResult.response_time),
+    else_=None
+)
+# Dialects whose INSERT supports ON CONFLICT DO NOTHING against the partial
+# unique index on active alerts
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+ENDPOINT_STATS = select(
+    func.count(MonitoringResult.id),
+    func.sum(case((MonitoringResult.is_success, 1), else_=0)),
+    func.avg(_positive_response_time),
+    func.min(_positive_response_time),
+    func.max(_positive_response_time)
+).where(
+    MonitoringResult.endpoint_id == bindparam('endpoint_id'),
+    MonitoringResult.timestamp >= bindparam('since')
+)
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled sockets use TCP_NODELAY and SO_KEEPALIVE"""
+    
+    socket_options = HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    ]
+    
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
 class APIMonitor:
     """API monitoring class that handles periodic checks of endpoints"""
     
+    # Connection pool sizing for the shared HTTP session
+    POOL_CONNECTIONS = 64
+    POOL_MAXSIZE = 64
+    
+    # Connection limits for the async fan-out in monitor_endpoints
+    ASYNC_CONNECTION_LIMIT = 200
+    ASYNC_KEEPALIVE_TIMEOUT = 60  # seconds
+    ASYNC_DNS_CACHE_TTL = 300  # seconds
+    
+    # Failed connects are retried this many times, by both check paths
+    CONNECT_RETRIES = 1
+    
+    # Response bodies are read only up to this size when checking endpoints
+    MAX_RESPONSE_BYTES = 64 * 1024
+    READ_CHUNK_SIZE = 16 * 1024
+    
+    # Background threads delivering alert and resolution emails outside Celery
+    MAIL_WORKERS = 4
+    
+    USER_AGENT = 'APIWatch/1.0'
+    
     def __init__(self, app):
         self.app = app
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'APIWatch/1.0'
+            'User-Agent': self.USER_AGENT,
+            'Connection': 'keep-alive'
         })
+        
+        # Keep connections to monitored hosts alive between checks so repeated
+        # checks skip the TCP/TLS handshake. Only connection failures are
+        # retried; read errors and bad statuses must surface as check results.
+        adapter = KeepAliveHTTPAdapter(
+            pool_connections=self.POOL_CONNECTIONS,
+            pool_maxsize=self.POOL_MAXSIZE,
+            pool_block=False,
+            max_retries=Retry(total=self.CONNECT_RETRIES, connect=self.CONNECT_RETRIES,
+                              read=0, status=0, other=0, redirect=False, backoff_factor=0)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # SMTP round-trips must not stall the monitoring cycle. Celery workers
+        # set email_tasks so mail is queued as tasks (see app/tasks.py); other
+        # processes fall back to the thread pool.
+        self.email_tasks = None
+        self._mail_pool = ThreadPoolExecutor(
+            max_workers=self.MAIL_WORKERS,
+            thread_name_prefix='apiwatch-mail'
+        )
+        atexit.register(self._mail_pool.shutdown, wait=True)
+    
+    def send_email(self, send, alert_id, endpoint_id):
+        """Deliver an alert or resolution email in its own app context"""
+        with self.app.app_context():
+            alert = db.session.get(Alert, alert_id)
+            endpoint = db.session.get(APIEndpoint, endpoint_id)
+            if alert is not None and endpoint is not None:
+                send(alert, endpoint)
+    
+    def _queue_email(self, send, alert_id, endpoint_id):
+        """Hand an email off to a Celery task or the mail pool"""
+        if self.email_tasks is not None:
+            self.email_tasks[send].delay(alert_id, endpoint_id)
+        else:
+            self._mail_pool.submit(self.send_email, send, alert_id, endpoint_id)
     
     def check_endpoint(self, endpoint):
-        """Check a single API endpoint and store results"""
+        """Check a single API endpoint and return the result fields"""
+        timestamp = datetime.utcnow()
         start_time = time.time()
-        response_time = 0
-        status_code = 0
-        is_success = False
-        error_message = None
-        response_size = 0
+        head_only = endpoint.check_mode == 'HEAD'
         
         try:
-            # Make the request
+            # Make the request; HEAD-mode endpoints skip the body entirely
             response = self.session.request(
-                method=endpoint.method,
+                method='HEAD' if head_only else endpoint.method,
                 url=endpoint.url,
                 headers=endpoint.headers,
-                timeout=endpoint.timeout
+                timeout=endpoint.timeout,
+                # A streamed HEAD is never marked consumed, so close() would
+                # drop its socket instead of returning it to the pool
+                stream=not head_only
             )
-            
-            # Calculate response time
-            response_time = (time.time() - start_time) * 1000  # Convert to milliseconds
-            status_code = response.status_code
-            response_size = len(response.content)
-            
-            # Determine if request was successful
-            is_success = 200 <= status_code < 300
-            
-        except requests.exceptions.Timeout:
-            error_message = "Request timeout"
-            response_time = endpoint.timeout * 1000
-        except requests.exceptions.ConnectionError:
-            error_message = "Connection error"
-        except requests.exceptions.RequestException as e:
-            error_message = f"Request failed: {str(e)}"
+            bytes_read = 0 if head_only else self._read_capped(
+                response.iter_content(chunk_size=self.READ_CHUNK_SIZE))
+            response.close()
         except Exception as e:
-            error_message = f"Unexpected error: {str(e)}"
-        
-        # Store the monitoring result
-        result = MonitoringResult(
-            endpoint_id=endpoint.id,
-            response_time=response_time,
-            status_code=status_code,
-            is_success=is_success,
-            error_message=error_message,
-            response_size=response_size
+            return self._build_result(endpoint, timestamp, start_time, error=e)
+        
+        # Results are persisted in batches by record_results()
+        return self._build_result(endpoint, timestamp, start_time, response.status_code,
+                                  response.headers.get('Content-Length'), bytes_read)
+    
+    async def _acheck(self, endpoint, session):
+        """Async variant of check_endpoint used by monitor_endpoints"""
+        timestamp = datetime.utcnow()
+        start_time = time.time()
+        head_only = endpoint.check_mode == 'HEAD'
+        
+        # Retry failed connects like the requests session's Retry policy;
+        # TLS errors are not retried there either
+        for attempt in range(self.CONNECT_RETRIES + 1):
+            try:
+                async with session.request(
+                    method='HEAD' if head_only else endpoint.method,
+                    url=endpoint.url,
+                    headers=endpoint.headers,
+                    timeout=aiohttp.ClientTimeout(total=endpoint.timeout)
+                ) as response:
+                    bytes_read = 0 if head_only else await self._aread_capped(
+                        response.content.iter_chunked(self.READ_CHUNK_SIZE))
+                break
+            except aiohttp.ClientConnectorError as e:
+                if isinstance(e, aiohttp.ClientSSLError) or attempt == self.CONNECT_RETRIES:
+                    return self._build_result(endpoint, timestamp, start_time, error=e)
+            except Exception as e:
+                return self._build_result(endpoint, timestamp, start_time, error=e)
+        
+        return self._build_result(endpoint, timestamp, start_time, response.status,
+                                  response.headers.get('Content-Length'), bytes_read)
+    
+    def _read_capped(self, chunks):
+        """Count body bytes from a chunk iterator, stopping at MAX_RESPONSE_BYTES"""
+        bytes_read = 0
+        for chunk in chunks:
+            bytes_read += len(chunk)
+            if bytes_read >= self.MAX_RESPONSE_BYTES:
+                break
+        return bytes_read
+    
+    async def _aread_capped(self, chunks):
+        """Async counterpart of _read_capped"""
+        bytes_read = 0
+        async for chunk in chunks:
+            bytes_read += len(chunk)
+            if bytes_read >= self.MAX_RESPONSE_BYTES:
+                break
+        return bytes_read
+    
+    @staticmethod
+    def _describe_error(error):
+        """Map a requests or aiohttp exception to (error_message, timed_out)"""
+        if isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError)):
+            return "Request timeout", True
+        if isinstance(error, (requests.exceptions.ConnectionError, aiohttp.ClientConnectionError)):
+            return "Connection error", False
+        if isinstance(error, (requests.exceptions.RequestException, aiohttp.ClientError)):
+            return f"Request failed: {str(error)}", False
+        return f"Unexpected error: {str(error)}", False
+    
+    def _build_result(self, endpoint, timestamp, start_time, status_code=0,
+                      content_length=None, bytes_read=0, error=None):
+        """Build the result fields shared by check_endpoint and _acheck"""
+        if error is not None:
+            error_message, timed_out = self._describe_error(error)
+            return {
+                'endpoint_id': endpoint.id,
+                'timestamp': timestamp,
+                'response_time': endpoint.timeout * 1000 if timed_out else 0,
+                'status_code': 0,
+                'is_success': False,
+                'error_message': error_message,
+                'response_size': 0
+            }
+        
+        return {
+            'endpoint_id': endpoint.id,
+            'timestamp': timestamp,
+            'response_time': (time.time() - start_time) * 1000,  # Convert to milliseconds
+            'status_code': status_code,
+            'is_success': 200 <= status_code < 300,
+            'error_message': None,
+            'response_size': self._response_size(content_length, bytes_read)
+        }
+    
+    @staticmethod
+    def _response_size(content_length, bytes_read):
+        """Prefer the advertised Content-Length over the (capped) bytes read"""
+        try:
+            return int(content_length)
+        except (TypeError, ValueError):
+            return bytes_read
+    
+    async def _run_all(self, endpoints):
+        """Check all endpoints concurrently over one shared connection pool"""
+        connector = aiohttp.TCPConnector(
+            limit=self.ASYNC_CONNECTION_LIMIT,
+            keepalive_timeout=self.ASYNC_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=self.ASYNC_DNS_CACHE_TTL
         )
+        async with aiohttp.ClientSession(
+            connector=connector,
+            headers={'User-Agent': self.USER_AGENT},
+            trust_env=True  # honour HTTP(S)_PROXY like the requests session
+        ) as session:
+            return await asyncio.gather(
+                *[self._acheck(endpoint, session) for endpoint in endpoints],
+                return_exceptions=True
+            )
+    
+    def record_results(self, checks):
+        """Store a batch of (endpoint, result) pairs and evaluate their alerts"""
+        if not checks:
+            return
         
         with self.app.app_context():
-            db.session.add(result)
+            # One multi-row INSERT and one commit for the whole batch
+            db.session.execute(
+                MonitoringResult.__table__.insert(),
+                [result for _, result in checks]
+            )
             db.session.commit()
             
-            # Check for alerts
-            self.check_alerts(endpoint, result)
-        
-        return result
+            # Check for alerts against a single snapshot of the active ones
+            active_alerts = self._load_active_alerts(
+                [endpoint.id for endpoint, _ in checks]
+            )
+            latency_threshold = self.app.config.get('LATENCY_THRESHOLD', 5000)
+            to_resolve = []
+            for endpoint, result in checks:
+                try:
+                    to_resolve.extend(
+                        (alert_id, alert_type, endpoint)
+                        for alert_id, alert_type in self.check_alerts(
+                            endpoint, result, active_alerts, latency_threshold)
+                    )
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.error(f"Error checking alerts for {endpoint.name}: {str(e)}")
+            
+            if to_resolve:
+                self._resolve_alerts(to_resolve)
     
-    def check_alerts(self, endpoint, result):
-        """Check if alerts should be created based on monitoring result"""
-        latency_threshold = current_app.config.get('LATENCY_THRESHOLD', 5000)
+    def _load_active_alerts(self, endpoint_ids):
+        """Index the batch's unresolved alert ids by endpoint id and alert type
         
+        Plain ids rather than Alert instances, so the commits made while the
+        batch is evaluated don't force a refresh SELECT per alert.
+        """
+        active_alerts = defaultdict(dict)
+        for alert_id, endpoint_id, alert_type in db.session.execute(
+            UNRESOLVED_ALERTS, {'endpoint_ids': endpoint_ids}
+        ):
+            active_alerts[endpoint_id][alert_type] = alert_id
+        return active_alerts
+    
+    def check_alerts(self, endpoint, result, active_alerts, latency_threshold):
+        """Create alerts for a monitoring result and return alerts it resolves"""
         # Check for API down (non-2xx status)
-        if not result.is_success:
+        if not result['is_success']:
             self.create_alert(endpoint, 'down', 
-                            f"API returned status {result.status_code}")
+                            f"API returned status {result['status_code']}",
+                            active_alerts)
         
         # Check for high latency
-        elif result.response_time > latency_threshold:
+        elif result['response_time'] > latency_threshold:
             self.create_alert(endpoint, 'high_latency',
-                            f"Response time {result.response_time:.0f}ms exceeds threshold {latency_threshold}ms")
+                            f"Response time {result['response_time']:.0f}ms exceeds threshold {latency_threshold}ms",
+                            active_alerts)
         
         # Check if previous alerts should be resolved
-        self.check_resolve_alerts(endpoint, result)
+        return self.check_resolve_alerts(endpoint, result, active_alerts, latency_threshold)
     
-    def create_alert(self, endpoint, alert_type, message):
+    def create_alert(self, endpoint, alert_type, message, active_alerts):
         """Create a new alert if one doesn't already exist"""
         # Check if there's already an active alert of this type
-        existing_alert = Alert.query.filter_by(
-            endpoint_id=endpoint.id,
-            alert_type=alert_type,
-            is_resolved=False
-        ).first()
+        existing_alert = active_alerts.get(endpoint.id, {}).get(alert_type)
         
         if not existing_alert:
-            alert = Alert(
-                endpoint_id=endpoint.id,
-                alert_type=alert_type,
-                message=message
-            )
-            
-            with self.app.app_context():
+            insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+            if insert is not None:
+                # Single race-safe statement; returns nothing when another
+                # worker already holds the active alert
+                alert_id = db.session.execute(
+                    insert(Alert).values(
+                        endpoint_id=endpoint.id,
+                        alert_type=alert_type,
+                        message=message
+                    ).on_conflict_do_nothing(
+                        index_elements=['endpoint_id', 'alert_type'],
+                        index_where=Alert.is_resolved == False
+                    ).returning(Alert.id)
+                ).scalar()
+                if alert_id is None:
+                    db.session.commit()
+                    return
+            else:
+                alert = Alert(
+                    endpoint_id=endpoint.id,
+                    alert_type=alert_type,
+                    message=message
+                )
                 db.session.add(alert)
-                db.session.commit()
-                
-                # Send email notification
-                send_alert_email(alert, endpoint)
-                
-                current_app.logger.info(f"Created {alert_type} alert for {endpoint.name}")
-    
-    def check_resolve_alerts(self, endpoint, result):
-        """Check if existing alerts should be resolved"""
-        latency_threshold = current_app.config.get('LATENCY_THRESHOLD', 5000)
-        
-        # Get all active alerts for this endpoint
-        active_alerts = Alert.query.filter_by(
-            endpoint_id=endpoint.id,
-            is_resolved=False
-        ).all()
-        
-        for alert in active_alerts:
+                db.session.flush()
+                alert_id = alert.id
+            
+            db.session.commit()
+            active_alerts[endpoint.id][alert_type] = alert_id
+            
+            # Send email notification
+            self._queue_email(send_alert_email, alert_id, endpoint.id)
+            
+            current_app.logger.info(f"Created {alert_type} alert for {endpoint.name}")
+    
+    def check_resolve_alerts(self, endpoint, result, active_alerts, latency_threshold):
+        """Return (alert_id, alert_type) pairs for alerts this result resolves"""
+        # Active alerts for this endpoint from the per-batch index
+        endpoint_alerts = active_alerts.get(endpoint.id, {})
+        resolved = []
+        
+        for alert_type, alert_id in list(endpoint_alerts.items()):
             should_resolve = False
             
-            if alert.alert_type == 'down' and result.is_success:
+            if alert_type == 'down' and result['is_success']:
                 should_resolve = True
-            elif alert.alert_type == 'high_latency' and result.response_time <= latency_threshold:
+            elif alert_type == 'high_latency' and result['response_time'] <= latency_threshold:
                 should_resolve = True
             
             if should_resolve:
-                alert.is_resolved = True
-                alert.resolved_at = datetime.utcnow()
-                
-                with self.app.app_context():
-                    db.session.commit()
-                    send_resolution_email(alert, endpoint)
-                    current_app.logger.info(f"Resolved {alert.alert_type} alert for {endpoint.name}")
+                del endpoint_alerts[alert_type]
+                resolved.append((alert_id, alert_type))
+        
+        return resolved
+    
+    def _resolve_alerts(self, resolved):
+        """Resolve (alert_id, alert_type, endpoint) entries with one UPDATE and notify"""
+        db.session.execute(
+            update(Alert)
+            .where(Alert.id.in_([alert_id for alert_id, _, _ in resolved]))
+            .values(is_resolved=True, resolved_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        
+        for alert_id, alert_type, endpoint in resolved:
+            self._queue_email(send_resolution_email, alert_id, endpoint.id)
+            current_app.logger.info(f"Resolved {alert_type} alert for {endpoint.name}")
     
     def monitor_all_endpoints(self):
         """Monitor all active endpoints"""
         with self.app.app_context():
-            active_endpoints = APIEndpoint.query.filter_by(is_active=True).all()
+            self._monitor(db.session.execute(ACTIVE_ENDPOINTS).scalars().all())
+    
+    def monitor_endpoints(self, endpoint_ids):
+        """Monitor a batch of endpoints; the scheduled path (see app/tasks.py)"""
+        with self.app.app_context():
+            self._monitor(db.session.execute(
+                ACTIVE_ENDPOINTS_BY_ID, {'endpoint_ids': endpoint_ids}
+            ).scalars().all())
+    
+    def _monitor(self, active_endpoints):
+        """Check endpoints concurrently and record them as one batch"""
+        if not active_endpoints:
+            return
+        
+        # Checks are network-bound, so run them all on one event loop and
+        # store the whole batch once the loop is done, keeping SQLAlchemy
+        # off the event loop entirely
+        results = asyncio.run(self._run_all(active_endpoints))
             
-            for endpoint in active_endpoints:
-                try:
-                    self.check_endpoint(endpoint)
-                    current_app.logger.info(f"Monitored {endpoint.name}")
-                except Exception as e:
-                    current_app.logger.error(f"Error monitoring {endpoint.name}: {str(e)}")
+        checks = []
+        for endpoint, result in zip(active_endpoints, results):
+            if isinstance(result, Exception):
+                current_app.logger.error(f"Error monitoring {endpoint.name}: {str(result)}")
+            else:
+                checks.append((endpoint, result))
+                current_app.logger.info(f"Monitored {endpoint.name}")
+        
+        self.record_results(checks)
+    
+    def prune_results(self, days=30):
+        """Delete monitoring results older than the retention window"""
+        with self.app.app_context():
+            cutoff = datetime.utcnow() - timedelta(days=days)
+            deleted = db.session.execute(
+                delete(MonitoringResult).where(MonitoringResult.timestamp < cutoff)
+            ).rowcount
+            db.session.commit()
+            return deleted
     
     def get_endpoint_stats(self, endpoint_id, hours=24):
         """Get statistics for an endpoint over the specified time period"""
         with self.app.app_context():
             since = datetime.utcnow() - timedelta(hours=hours)
             
-            results = MonitoringResult.query.filter(
-                MonitoringResult.endpoint_id == endpoint_id,
-                MonitoringResult.timestamp >= since
-            ).order_by(MonitoringResult.timestamp).all()
+            # Aggregate in the database; only positive response times count
+            # towards avg/min/max (failed checks are recorded with 0)
+            total_checks, successful_checks, avg_response_time, \
+                min_response_time, max_response_time = db.session.execute(
+                    ENDPOINT_STATS, {'endpoint_id': endpoint_id, 'since': since}
+                ).one()
             
-            if not results:
+            if not total_checks:
                 return {
                     'total_checks': 0,
                     'success_rate': 0,
@@ -171,22 +467,15 @@ class APIMonitor:
                     'error_count': 0
                 }
             
-            total_checks = len(results)
-            successful_checks = sum(1 for r in results if r.is_success)
+            successful_checks = successful_checks or 0
             success_rate = (successful_checks / total_checks) * 100
-            
-            response_times = [r.response_time for r in results if r.response_time > 0]
-            avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-            min_response_time = min(response_times) if response_times else 0
-            max_response_time = max(response_times) if response_times else 0
-            
-            error_count = sum(1 for r in results if not r.is_success)
+            error_count = total_checks - successful_checks
             
             return {
                 'total_checks': total_checks,
                 'success_rate': round(success_rate, 2),
-                'avg_response_time': round(avg_response_time, 2),
-                'min_response_time': round(min_response_time, 2),
-                'max_response_time': round(max_response_time, 2),
+                'avg_response_time': round(float(avg_response_time or 0), 2),
+                'min_response_time': round(float(min_response_time or 0), 2),
+                'max_response_time': round(float(max_response_time or 0), 2),
                 'error_count': error_count
             }
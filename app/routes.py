@@ -1,26 +1,34 @@
-from flask import render_template, request, jsonify, redirect, url_for, flash
+from flask import render_template, request, jsonify, redirect, url_for, flash, Response, current_app, stream_with_context
 from app import app, db
 from app.models import APIEndpoint, MonitoringResult, Alert
-from app.monitor import APIMonitor
+from sqlalchemy import func, case, select
+from sqlalchemy.orm import joinedload
+import orjson
 from datetime import datetime, timedelta
 import json
 
-# Initialize API monitor
-api_monitor = APIMonitor(app)
+# Supported values for APIEndpoint.check_mode
+CHECK_MODES = ('GET', 'HEAD')
 
 @app.route('/')
 def dashboard():
     """Main dashboard page"""
-    # Get all endpoints
-    endpoints = APIEndpoint.query.all()
+    # Get all endpoints (only the columns the endpoint list renders)
+    endpoints = APIEndpoint.query.with_entities(
+        APIEndpoint.id,
+        APIEndpoint.name,
+        APIEndpoint.url,
+        APIEndpoint.method,
+        APIEndpoint.is_active
+    ).all()
     
     # Get recent alerts
-    recent_alerts = Alert.query.filter_by(is_resolved=False).order_by(Alert.timestamp.desc()).limit(10).all()
+    recent_alerts = Alert.query.options(joinedload(Alert.endpoint)).filter_by(is_resolved=False).order_by(Alert.timestamp.desc()).limit(10).all()
     
     # Get overall stats
-    total_endpoints = len(endpoints)
-    active_endpoints = len([e for e in endpoints if e.is_active])
-    active_alerts = len(recent_alerts)
+    total_endpoints = APIEndpoint.query.count()
+    active_endpoints = APIEndpoint.query.filter_by(is_active=True).count()
+    active_alerts = Alert.query.filter_by(is_resolved=False).count()
     
     return render_template('dashboard.html',
                          endpoints=endpoints,
@@ -32,15 +40,26 @@ def dashboard():
 @app.route('/api/endpoints', methods=['GET'])
 def get_endpoints():
     """Get all API endpoints"""
-    endpoints = APIEndpoint.query.all()
+    rows = db.session.execute(
+        select(
+            APIEndpoint.id,
+            APIEndpoint.name,
+            APIEndpoint.url,
+            APIEndpoint.method,
+            APIEndpoint.check_mode,
+            APIEndpoint.is_active,
+            APIEndpoint.created_at
+        )
+    ).all()
     return jsonify([{
-        'id': e.id,
-        'name': e.name,
-        'url': e.url,
-        'method': e.method,
-        'is_active': e.is_active,
-        'created_at': e.created_at.isoformat()
-    } for e in endpoints])
+        'id': endpoint_id,
+        'name': name,
+        'url': url,
+        'method': method,
+        'check_mode': check_mode,
+        'is_active': is_active,
+        'created_at': created_at.isoformat()
+    } for endpoint_id, name, url, method, check_mode, is_active, created_at in rows])
 
 @app.route('/api/endpoints', methods=['POST'])
 def add_endpoint():
@@ -52,11 +71,16 @@ def add_endpoint():
         if not data.get('name') or not data.get('url'):
             return jsonify({'error': 'Name and URL are required'}), 400
         
+        check_mode = str(data.get('check_mode', 'GET')).upper()
+        if check_mode not in CHECK_MODES:
+            return jsonify({'error': f"check_mode must be one of {', '.join(CHECK_MODES)}"}), 400
+        
         # Create new endpoint
         endpoint = APIEndpoint(
             name=data['name'],
             url=data['url'],
             method=data.get('method', 'GET'),
+            check_mode=check_mode,
             headers=data.get('headers', {}),
             timeout=data.get('timeout', 30),
             is_active=data.get('is_active', True)
@@ -70,6 +94,7 @@ def add_endpoint():
             'name': endpoint.name,
             'url': endpoint.url,
             'method': endpoint.method,
+            'check_mode': endpoint.check_mode,
             'is_active': endpoint.is_active
         }), 201
         
@@ -90,6 +115,11 @@ def update_endpoint(endpoint_id):
             endpoint.url = data['url']
         if 'method' in data:
             endpoint.method = data['method']
+        if 'check_mode' in data:
+            check_mode = str(data['check_mode']).upper()
+            if check_mode not in CHECK_MODES:
+                return jsonify({'error': f"check_mode must be one of {', '.join(CHECK_MODES)}"}), 400
+            endpoint.check_mode = check_mode
         if 'headers' in data:
             endpoint.headers = data['headers']
         if 'timeout' in data:
@@ -125,26 +155,40 @@ def get_endpoint_stats(endpoint_id):
     """Get statistics for a specific endpoint"""
     try:
         hours = request.args.get('hours', 24, type=int)
-        stats = api_monitor.get_endpoint_stats(endpoint_id, hours)
+        stats = current_app.api_monitor.get_endpoint_stats(endpoint_id, hours)
         
         # Get recent results for chart data
         since = datetime.utcnow() - timedelta(hours=hours)
-        results = MonitoringResult.query.filter(
-            MonitoringResult.endpoint_id == endpoint_id,
-            MonitoringResult.timestamp >= since
-        ).order_by(MonitoringResult.timestamp).all()
+        rows = db.session.execute(
+            select(
+                MonitoringResult.timestamp,
+                MonitoringResult.response_time,
+                MonitoringResult.status_code,
+                MonitoringResult.is_success
+            ).where(
+                MonitoringResult.endpoint_id == endpoint_id,
+                MonitoringResult.timestamp >= since
+            ).order_by(MonitoringResult.timestamp)
+            .execution_options(yield_per=1000)
+        )
         
-        chart_data = [{
-            'timestamp': result.timestamp.isoformat(),
-            'response_time': result.response_time,
-            'status_code': result.status_code,
-            'is_success': result.is_success
-        } for result in results]
+        def generate():
+            # Stream chart data one cursor batch at a time. Plain row tuples
+            # skip ORM hydration; orjson encodes the datetimes in the same
+            # ISO 8601 form as isoformat()
+            yield b'{"stats":' + orjson.dumps(stats) + b',"chart_data":['
+            separator = b''
+            for partition in rows.partitions():
+                yield separator + b','.join(orjson.dumps({
+                    'timestamp': timestamp,
+                    'response_time': response_time,
+                    'status_code': status_code,
+                    'is_success': is_success
+                }) for timestamp, response_time, status_code, is_success in partition)
+                separator = b','
+            yield b']}'
         
-        return jsonify({
-            'stats': stats,
-            'chart_data': chart_data
-        })
+        return Response(stream_with_context(generate()), mimetype='application/json')
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -154,14 +198,16 @@ def test_endpoint(endpoint_id):
     """Test a specific endpoint immediately"""
     try:
         endpoint = APIEndpoint.query.get_or_404(endpoint_id)
+        api_monitor = current_app.api_monitor
         result = api_monitor.check_endpoint(endpoint)
+        api_monitor.record_results([(endpoint, result)])
         
         return jsonify({
-            'response_time': result.response_time,
-            'status_code': result.status_code,
-            'is_success': result.is_success,
-            'error_message': result.error_message,
-            'timestamp': result.timestamp.isoformat()
+            'response_time': result['response_time'],
+            'status_code': result['status_code'],
+            'is_success': result['is_success'],
+            'error_message': result['error_message'],
+            'timestamp': result['timestamp'].isoformat()
         })
         
     except Exception as e:
@@ -171,17 +217,29 @@ def test_endpoint(endpoint_id):
 def get_alerts():
     """Get all alerts"""
     resolved = request.args.get('resolved', 'false').lower() == 'true'
-    alerts = Alert.query.filter_by(is_resolved=resolved).order_by(Alert.timestamp.desc()).all()
+    rows = db.session.execute(
+        select(
+            Alert.id,
+            APIEndpoint.name,
+            Alert.alert_type,
+            Alert.message,
+            Alert.timestamp,
+            Alert.is_resolved,
+            Alert.resolved_at
+        ).join(APIEndpoint, Alert.endpoint_id == APIEndpoint.id)
+        .where(Alert.is_resolved == resolved)
+        .order_by(Alert.timestamp.desc())
+    ).all()
     
     return jsonify([{
-        'id': a.id,
-        'endpoint_name': a.endpoint.name,
-        'alert_type': a.alert_type,
-        'message': a.message,
-        'timestamp': a.timestamp.isoformat(),
-        'is_resolved': a.is_resolved,
-        'resolved_at': a.resolved_at.isoformat() if a.resolved_at else None
-    } for a in alerts])
+        'id': alert_id,
+        'endpoint_name': endpoint_name,
+        'alert_type': alert_type,
+        'message': message,
+        'timestamp': timestamp.isoformat(),
+        'is_resolved': is_resolved,
+        'resolved_at': resolved_at.isoformat() if resolved_at else None
+    } for alert_id, endpoint_name, alert_type, message, timestamp, is_resolved, resolved_at in rows])
 
 @app.route('/api/alerts/<int:alert_id>/resolve', methods=['POST'])
 def resolve_alert(alert_id):
@@ -209,18 +267,19 @@ def get_dashboard_stats():
         
         # Get recent monitoring activity (last 24 hours)
         since = datetime.utcnow() - timedelta(hours=24)
-        recent_results = MonitoringResult.query.filter(
+        total_checks, successful_checks, avg_response_time = db.session.query(
+            func.count(MonitoringResult.id),
+            func.sum(case((MonitoringResult.is_success, 1), else_=0)),
+            func.avg(case(
+                (MonitoringResult.response_time > 0, MonitoringResult.response_time),
+                else_=None
+            ))
+        ).filter(
             MonitoringResult.timestamp >= since
-        ).all()
-        
-        total_checks = len(recent_results)
-        successful_checks = sum(1 for r in recent_results if r.is_success)
-        success_rate = (successful_checks / total_checks * 100) if total_checks > 0 else 0
+        ).one()
         
-        avg_response_time = 0
-        if recent_results:
-            response_times = [r.response_time for r in recent_results if r.response_time > 0]
-            avg_response_time = sum(response_times) / len(response_times) if response_times else 0
+        success_rate = ((successful_checks or 0) / total_checks * 100) if total_checks > 0 else 0
+        avg_response_time = float(avg_response_time or 0)
         
         return jsonify({
             'total_endpoints': total_endpoints,
@@ -238,7 +297,7 @@ def get_dashboard_stats():
 def start_monitoring():
     """Start monitoring all endpoints"""
     try:
-        api_monitor.monitor_all_endpoints()
+        current_app.api_monitor.monitor_all_endpoints()
         return jsonify({'message': 'Monitoring completed successfully'})
         
     except Exception as e:
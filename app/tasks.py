@@ -0,0 +1,94 @@
+from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_init, worker_process_init
+from sqlalchemy import select
+from app import app
+from app.models import db, APIEndpoint
+from app.email_alerts import send_alert_email, send_resolution_email
+
+# Celery application; beat schedules the fan-out, workers run the checks
+celery_app = Celery('apiwatch', broker=app.config['CELERY_BROKER_URL'])
+celery_app.conf.update(
+    # Acknowledge after the check finishes and hand out one task at a time,
+    # so an endpoint that times out doesn't hold back prefetched checks
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    beat_schedule={
+        'monitor-all': {
+            'task': 'dispatch_all',
+            'schedule': app.config.get('MONITORING_INTERVAL', 60),
+        },
+        'prune-results': {
+            'task': 'prune_results',
+            'schedule': crontab(minute=0),
+        },
+    },
+)
+
+ACTIVE_ENDPOINT_IDS = select(APIEndpoint.id).where(APIEndpoint.is_active == True)
+
+# Endpoints checked together by one task: concurrently on one event loop,
+# stored with one INSERT and one alert prefetch
+CHECK_BATCH_SIZE = 50
+
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    """Drop DB connections inherited from the prefork parent
+    
+    Importing the app runs db.create_all() in the parent, so each child would
+    otherwise share the parent's pooled socket. close=False leaves that socket
+    open for the parent while the child starts with an empty pool.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+@worker_init.connect
+def use_email_tasks(**kwargs):
+    """Send alert emails as tasks instead of through the monitor's thread pool
+    
+    Pool children exit with os._exit, so atexit never drains that pool and
+    queued emails would be lost when a child is recycled. Runs before the
+    children fork, so they inherit the setting.
+    """
+    app.api_monitor.email_tasks = {
+        send_alert_email: send_alert_email_task,
+        send_resolution_email: send_resolution_email_task,
+    }
+
+@celery_app.task(name='dispatch_all')
+def dispatch_all():
+    """Queue check tasks for all active endpoints in batches of CHECK_BATCH_SIZE"""
+    with app.app_context():
+        endpoint_ids = db.session.execute(ACTIVE_ENDPOINT_IDS).scalars().all()
+    
+    # Checks still queued when the next cycle is dispatched are discarded
+    # instead of running late and piling up behind slow endpoints
+    interval = app.config.get('MONITORING_INTERVAL', 60)
+    for start in range(0, len(endpoint_ids), CHECK_BATCH_SIZE):
+        check_endpoints_task.apply_async(
+            (endpoint_ids[start:start + CHECK_BATCH_SIZE],), expires=interval
+        )
+    
+    app.logger.info(f"Dispatched checks for {len(endpoint_ids)} endpoints")
+
+@celery_app.task(name='check_endpoints')
+def check_endpoints_task(endpoint_ids):
+    """Check a batch of endpoints and store the results"""
+    app.api_monitor.monitor_endpoints(endpoint_ids)
+
+@celery_app.task(name='send_alert_email')
+def send_alert_email_task(alert_id, endpoint_id):
+    """Email the configured recipients about a new alert"""
+    app.api_monitor.send_email(send_alert_email, alert_id, endpoint_id)
+
+@celery_app.task(name='send_resolution_email')
+def send_resolution_email_task(alert_id, endpoint_id):
+    """Email the configured recipients that an alert was resolved"""
+    app.api_monitor.send_email(send_resolution_email, alert_id, endpoint_id)
+
+@celery_app.task(name='prune_results')
+def prune_results():
+    """Delete monitoring results past the retention window"""
+    days = app.config.get('RESULT_RETENTION_DAYS', 30)
+    deleted = app.api_monitor.prune_results(days)
+    app.logger.info(f"Pruned {deleted} monitoring results older than {days} days")
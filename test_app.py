@@ -18,11 +18,13 @@ def test_flask_app():
         
         with app.app_context():
             from app.models import db
+            from sqlalchemy import text
             print("✅ Database models loaded successfully")
             
             # Test database connection
             try:
-                db.engine.execute("SELECT 1")
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
                 print("✅ Database connection successful")
             except Exception as e:
                 print(f"❌ Database connection failed: {e}")
@@ -108,9 +110,12 @@ def test_dependencies():
         'flask_sqlalchemy',
         'psycopg2',
         'requests',
+        'aiohttp',
         'python_dotenv',
         'flask_mail',
-        'apscheduler',
+        'orjson',
+        'celery',
+        'redis',
         'gunicorn'
     ]
     